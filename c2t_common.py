@@ -0,0 +1,380 @@
+# Shared traversal and file storage helpers for code2test.py and code2testt.py
+import os
+import fnmatch
+import hashlib
+import itertools
+import mmap
+import re
+import sys
+import shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+# --- Configuration ---
+
+# Patterns to ignore during directory traversal
+IGNORE_PATTERNS = [
+    'node_modules',
+    'package-lock.json',
+    '.env',
+    '.DS_Store',
+    '.git',
+    'public',
+    '__pycache__',
+    'generate_tests.py', # Ignore the script itself
+    'output.txt',
+    'postman.json',
+    'seedDatabase.ts',
+    '.next',
+    'dist',
+    'scripts',
+    'venv',
+    'robot_tests', # Ignore the default output directory
+    '*.log',
+    '*.xml', # Ignore report files etc.
+    '*.png',
+    '*.zip',
+    '*.svg',
+    '*.jpg',
+    '.sauce',
+    '.storybook',
+    'test',
+    '.backtracejsrc',
+    '.dockerignore',
+    '.dockerfile',
+    'Dockerfile',
+    'docker-compose.yml',
+    'docker-compose.override.yml',
+    'docker-compose.override.yaml',
+    '.github',
+    'README.md',
+    'LICENSE.*',
+    'Jenkinsfile',
+    'Makefile',
+    'Makefile.*',
+    '__tests__',
+    '__mocks__'
+
+]
+
+# Only files with these extensions (or one of the names below) are read and embedded in the prompt;
+# other files are listed with a skip marker
+SOURCE_EXTENSIONS = frozenset([
+    '.py', '.js', '.jsx', '.mjs', '.cjs', '.ts', '.tsx', '.vue', '.svelte',
+    '.html', '.htm', '.css', '.scss', '.sass', '.less', '.json',
+    '.md', '.txt', '.yml', '.yaml', '.toml', '.cfg', '.ini', '.robot', '.sh'
+])
+# Well-known source/config files without a usable extension
+SOURCE_FILENAMES = frozenset([
+    'Procfile', 'Pipfile', 'Gemfile', '.babelrc', '.eslintrc', '.prettierrc', '.nvmrc', '.npmrc'
+])
+# Default size above which files are not embedded in the prompt
+MAX_FILE_BYTES = 1024 * 1024
+# Files larger than this are read through mmap instead of os.read()
+MMAP_THRESHOLD_BYTES = 64 * 1024
+# Chunk size for raw os.read calls while dumping source files
+READ_CHUNK_SIZE = 256 * 1024
+# Number of threads used to read source files concurrently
+READ_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+# Maximum number of file reads submitted ahead of the one being written
+READ_AHEAD_FILES = 2 * READ_WORKERS
+# Maximum number of threads used to write generated files concurrently
+WRITE_WORKERS = 32
+
+# Characters that make an ignore pattern a glob rather than a literal name
+GLOB_CHARS_PATTERN = re.compile(r'[*?\[]')
+
+# --- Ignore Matching ---
+
+def compile_ignore_patterns(ignore_patterns):
+    """
+    Compiles the ignore patterns once, partitioned by how cheaply they can be tested:
+    literal names go into a frozenset, simple '*suffix' globs into a tuple for str.endswith,
+    and only the remaining globs into a single regex union.
+    Returns a predicate taking a bare file/directory name and returning True if it is ignored.
+    """
+    literal_names = frozenset(p for p in ignore_patterns if not GLOB_CHARS_PATTERN.search(p))
+    suffix_patterns = [p for p in ignore_patterns if p.startswith('*') and not GLOB_CHARS_PATTERN.search(p[1:])]
+    suffixes = tuple(p[1:] for p in suffix_patterns)
+    glob_patterns = [p for p in ignore_patterns if p not in literal_names and p not in suffix_patterns]
+    glob_regex = None
+    if glob_patterns:
+        glob_regex = re.compile('|'.join('(?:' + fnmatch.translate(p) + ')' for p in glob_patterns))
+
+    # Cached per compiled pattern list, so repeated names (index.ts, package.json, ...) are decided once
+    @lru_cache(maxsize=4096)
+    def is_ignored_name(name):
+        # Cheapest checks first: hashed lookup, then a single C-level endswith
+        if name in literal_names or name.endswith(suffixes):
+            return True
+        return glob_regex is not None and glob_regex.match(name) is not None
+
+    return is_ignored_name
+
+# Precompiled matcher for the default ignore list
+IGNORE_MATCHER = compile_ignore_patterns(IGNORE_PATTERNS)
+
+# --- Directory Traversal ---
+
+def scan_files(dir_path, ignore_matcher, files, rel_prefix=""):
+    """
+    Recursively collects (path, relative_path) pairs for the non-ignored files under dir_path.
+    Uses os.scandir so the entry type comes from the cached DirEntry instead of an extra stat per path.
+    Relative paths are built from rel_prefix as we descend, instead of os.path.relpath per file.
+    Files of a directory are collected before descending into its subdirectories (same order as os.walk).
+    """
+    subdirs = []
+    try:
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                # Decide on the bare entry name before any type check or recursion
+                if ignore_matcher(entry.name):
+                    continue
+                # Don't follow directory symlinks, matching os.walk's default
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append((entry.path, rel_prefix + entry.name + os.sep))
+                elif entry.is_file():
+                    files.append((entry.path, rel_prefix + entry.name))
+    except OSError as e:
+        print(f"Warning: Could not scan directory {dir_path}: {e}", file=sys.stderr)
+        return
+    for subdir_path, subdir_prefix in subdirs:
+        scan_files(subdir_path, ignore_matcher, files, subdir_prefix)
+
+def is_source_file(name):
+    """Check if a bare file name is one whose content belongs in the prompt (see SOURCE_EXTENSIONS)."""
+    return name in SOURCE_FILENAMES or os.path.splitext(name)[1].lower() in SOURCE_EXTENSIONS
+
+def read_source_file(file_path, relative_path, max_bytes=MAX_FILE_BYTES):
+    """
+    Reads one file for the source dump with raw os calls, avoiding the text-mode I/O stack per file.
+    Returns (content, digest): the file's bytes as read and their SHA-256 digest, or a UTF-8 encoded
+    bracketed marker and None if the file was skipped, unreadable or empty (nothing worth deduplicating).
+    Non-source files and files above max_bytes are skipped before any content is read; files above
+    MMAP_THRESHOLD_BYTES are hashed straight from a memory map.
+    """
+    marker = None
+    # Skip binaries, assets and other non-source files without opening them
+    if not is_source_file(os.path.basename(file_path)):
+        marker = f"[Skipped file {relative_path}: not a source file]"
+    else:
+        try:
+            fd = os.open(file_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+            try:
+                file_size = os.fstat(fd).st_size
+                if file_size > max_bytes:
+                    marker = f"[Skipped file {relative_path}: larger than {max_bytes} bytes]"
+                elif file_size > MMAP_THRESHOLD_BYTES:
+                    with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mapped:
+                        # Hash in the worker thread; hashlib releases the GIL on large buffers
+                        digest = hashlib.sha256(mapped).digest()
+                        content = mapped[:]
+                else:
+                    chunks = []
+                    while chunk := os.read(fd, READ_CHUNK_SIZE):
+                        chunks.append(chunk)
+                    content = b"".join(chunks)
+                    digest = hashlib.sha256(content).digest() if content else None
+            finally:
+                os.close(fd)
+        except Exception as e:
+            marker = f"[Error reading file {relative_path}: {e}]"
+    if marker is not None:
+        return marker.encode('utf-8'), None
+    # Keep the newline translation text mode used to do
+    return content.replace(b"\r\n", b"\n"), digest
+
+def traverse_directory(root_dir, ignore_patterns, write, max_file_bytes=MAX_FILE_BYTES):
+    """
+    Traverses the directory, reads file contents, and formats the structure.
+    Excludes specified patterns and embeds only files up to max_file_bytes.
+    The formatted output is passed to write() piece by piece as UTF-8 bytes as it is produced, so the
+    whole corpus never has to be held as one string and file contents go through without a decode and
+    re-encode per file (e.g. a binary file's write, or a list's append). Returns the number of files written.
+    """
+    # Normalize root_dir path once; relative paths are built during the walk
+    root_dir = os.path.abspath(root_dir)
+    print(f"Starting traversal from: {root_dir}")
+    print(f"Ignoring patterns: {ignore_patterns}")
+
+    # The default list is already compiled at import; only custom lists are compiled here
+    ignore_matcher = IGNORE_MATCHER if ignore_patterns == IGNORE_PATTERNS else compile_ignore_patterns(ignore_patterns)
+
+    files = []
+    scan_files(root_dir, ignore_matcher, files)
+
+    # Reads are I/O bound and release the GIL, so overlap them; futures are consumed in traversal order
+    # Only READ_AHEAD_FILES reads are in flight or finished-but-unwritten at once, so a slow early file
+    # can't let the rest of the corpus pile up in memory
+    # Content digest -> first file seen with that content, so identical files are only embedded once
+    seen_digests = {}
+    with ThreadPoolExecutor(max_workers=READ_WORKERS) as executor:
+        reads = (
+            (relative_path, executor.submit(read_source_file, file_path, relative_path, max_file_bytes))
+            for file_path, relative_path in files
+        )
+        pending = deque(itertools.islice(reads, READ_AHEAD_FILES))
+        while pending:
+            relative_path, future = pending.popleft()
+            content, digest = future.result()
+            # Top the window back up before writing this file
+            pending.extend(itertools.islice(reads, 1))
+            write(f"--- File: {relative_path} ---\n".encode('utf-8'))
+            if digest is not None and digest in seen_digests:
+                write(f"[Duplicate of {seen_digests[digest]}]".encode('utf-8'))
+            else:
+                if digest is not None:
+                    seen_digests[digest] = relative_path
+                write(content)
+            write(b"\n\n")
+
+    if not files:
+        print("Warning: No files found or read after applying ignore patterns.")
+    return len(files)
+
+# --- File Storage ---
+
+# The same relative paths come back from generation and validation, so normalize each only once
+normalize_path = lru_cache(maxsize=512)(os.path.normpath)
+
+def resolve_output_path(relative_file_path, abs_output_dir, output_prefix):
+    """
+    Validates a file path provided by the AI and resolves it inside abs_output_dir.
+    output_prefix is abs_output_dir with a trailing separator, computed once by the caller.
+    Returns the absolute path to write to, or None (with a warning) if the path is unsafe or invalid.
+    """
+    # Basic validation: Ensure relative_file_path is not empty or just whitespace
+    if not relative_file_path or relative_file_path.isspace():
+        print(f"Warning: Skipping file with invalid relative path provided by AI: '{relative_file_path}'", file=sys.stderr)
+        return None
+
+    # Normalize the AI-provided relative path
+    normalized_relative_path = normalize_path(relative_file_path)
+
+    # Prevent paths trying to go 'up' (e.g., ../../etc/passwd)
+    if ".." in normalized_relative_path.split(os.sep):
+         print(f"Warning: Skipping potentially unsafe file path provided by AI: '{relative_file_path}'", file=sys.stderr)
+         return None
+
+    # Prevent absolute paths from AI response
+    if os.path.isabs(normalized_relative_path):
+         print(f"Warning: Skipping absolute file path provided by AI: '{relative_file_path}'", file=sys.stderr)
+         return None
+
+    # Construct the full, absolute path
+    full_path = os.path.join(abs_output_dir, normalized_relative_path)
+    full_path = os.path.abspath(full_path)
+
+    # Security Check: Ensure the final path is truly within the output directory
+    # Allow writing to the output directory itself (e.g., README.md)
+    if not full_path.startswith(output_prefix) and full_path != abs_output_dir:
+        print(f"Warning: Skipping file path attempting to write outside output directory: '{relative_file_path}' resolved to '{full_path}' (outside '{abs_output_dir}')", file=sys.stderr)
+        return None
+
+    return full_path
+
+def write_text_file(full_path, content):
+    """Encodes content as UTF-8 once and writes it with raw os.write calls, bypassing the text-mode I/O layer."""
+    data = memoryview(content.encode('utf-8'))
+    fd = os.open(full_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+    try:
+        # os.write may write less than asked, so loop until everything is out
+        while data:
+            data = data[os.write(fd, data):]
+    finally:
+        os.close(fd)
+
+def write_output_file(full_path, content):
+    """
+    Writes one generated file. Runs on worker threads, so it reports instead of printing:
+    returns None on success or the exception that prevented the write.
+    """
+    try:
+        write_text_file(full_path, content)
+        return None
+    except Exception as e:
+        return e
+
+def write_output_files(pending_writes, quiet=False):
+    """
+    Writes (full_path, content) pairs concurrently and reports each result in order; returns the number written.
+    With quiet=True only failures are reported.
+    """
+    if not pending_writes:
+        return 0
+    files_written = 0
+    # Writes are independent, so overlap their open/write/close syscalls
+    with ThreadPoolExecutor(max_workers=min(WRITE_WORKERS, len(pending_writes))) as executor:
+        errors = executor.map(lambda item: write_output_file(*item), pending_writes)
+        for (full_path, _), error in zip(pending_writes, errors):
+            if error is None:
+                if not quiet:
+                    print(f"Wrote file: {full_path}")
+                files_written += 1
+            else:
+                print(f"Error writing file {full_path}: {error}", file=sys.stderr)
+    return files_written
+
+def store_test_files(files, output_dir="robot_tests", clear_output=False, quiet=False):
+    """
+    Stores the generated files in the specified directory and returns the number written.
+    quiet=True drops the progress messages (warnings and errors still go to stderr), for callers
+    saving from a background thread.
+    """
+    if not quiet:
+        print(f"--- Storing Files in {output_dir} ---")
+
+    # Use absolute path for output directory for reliable checks
+    abs_output_dir = os.path.abspath(output_dir)
+
+    if clear_output and os.path.exists(abs_output_dir):
+        try:
+            shutil.rmtree(abs_output_dir)
+            if not quiet:
+                print(f"Cleared existing output directory: {abs_output_dir}")
+        except OSError as e:
+            print(f"Error clearing directory {abs_output_dir}: {e}", file=sys.stderr)
+
+    # Ensure the base output directory exists after potential clearing
+    try:
+        os.makedirs(abs_output_dir, exist_ok=True)
+    except OSError as e:
+        print(f"Error creating directory {abs_output_dir}: {e}", file=sys.stderr)
+        sys.exit(1) # Exit if we can't create the main output dir
+
+    # Validate every path and create the needed subdirectories serially,
+    # so the concurrent writes below never race on os.makedirs
+    # Keyed by the case-normalized full path: keys that resolve to the same file (e.g. 'pages/a.robot'
+    # from generation and './pages/a.robot' from validation) must not become concurrent writes, so
+    # only the last content is kept, as the serial writes used to leave it
+    pending_writes = {}
+    # Many files share a parent directory: remember which ones are known to exist and which
+    # couldn't be created, so each directory costs at most one makedirs call
+    ready_dirs = {abs_output_dir}
+    failed_dirs = {}
+    # Prefix for the containment check, built once rather than per file
+    output_prefix = os.path.join(abs_output_dir, '')
+    for relative_file_path, content in files.items():
+        full_path = resolve_output_path(relative_file_path, abs_output_dir, output_prefix)
+        if full_path is None:
+            continue
+
+        file_dir = os.path.dirname(full_path)
+        if file_dir and file_dir not in ready_dirs:
+            if file_dir not in failed_dirs:
+                try:
+                    os.makedirs(file_dir, exist_ok=True)
+                except OSError as e:
+                    failed_dirs[file_dir] = e
+            if file_dir in failed_dirs:
+                print(f"Error creating subdirectory {file_dir} for {full_path}: {failed_dirs[file_dir]}", file=sys.stderr)
+                continue # Skip this file if subdirectory creation fails
+            ready_dirs.add(file_dir)
+        pending_writes[os.path.normcase(full_path)] = (full_path, content)
+
+    files_written = write_output_files(list(pending_writes.values()), quiet)
+
+    if not quiet:
+        print(f"--- Finished Storing Files ({files_written} written) ---")
+    return files_written
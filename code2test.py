@@ -1,117 +1,100 @@
 import argparse
 import os
-import fnmatch
+import itertools
 import sys
 import shutil
 import json
+import io
 import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import google.generativeai as genai
+from c2t_common import IGNORE_PATTERNS, SOURCE_EXTENSIONS, SOURCE_FILENAMES, MAX_FILE_BYTES, traverse_directory, write_text_file, store_test_files
+
+try:
+    # Optional: orjson parses and serializes the LLM-sized JSON payloads several times faster
+    import orjson
+except ImportError:
+    orjson = None
 
 # --- Configuration ---
 
-# Patterns to ignore during directory traversal
-IGNORE_PATTERNS = [
-    'node_modules',
-    'package-lock.json',
-    '.env',
-    '.DS_Store',
-    '.git',
-    'public',
-    '__pycache__',
-    'generate_tests.py', # Ignore the script itself
-    'output.txt',
-    'postman.json',
-    'seedDatabase.ts',
-    '.next',
-    'dist',
-    'scripts',
-    'venv',
-    'robot_tests', # Ignore the default output directory
-    '*.log',
-    '*.xml', # Ignore report files etc.
-    '*.png',
-    '*.zip',
-    '*.svg',
-    '*.jpg',
-    '.sauce',
-    '.storybook',
-    'test',
-    '.backtracejsrc',
-    '.dockerignore',
-    '.dockerfile',
-    'Dockerfile',
-    'docker-compose.yml',
-    'docker-compose.override.yml',
-    'docker-compose.override.yaml',
-    '.github',
-    'README.md',
-    'LICENSE.*',
-    'Jenkinsfile',
-    'Makefile',
-    'Makefile.*',
-    '__tests__',
-    '__mocks__'
-
-]
+# Patterns for parsing AI responses, compiled once at import
+# A ```json ... ``` block (Agent 1 plan)
+JSON_BLOCK_PATTERN = re.compile(r"```json\s*([\s\S]*?)\s*```")
+# A fenced block with or without the json language tag (Agent 3 report)
+FENCED_BLOCK_PATTERN = re.compile(r"```(?:json)?\s*([\s\S]*?)\s*```")
+# Characters that matter when scanning for a brace-balanced JSON object
+JSON_STRUCTURE_PATTERN = re.compile(r'[{}"\\]')
+# Fence markers wrapping the entire response
+OUTER_FENCE_PATTERN = re.compile(r"^```(?:json)?\s*([\s\S]*)\s*```$")
+# Matches lines like "--- File: path/to/file ---" or "--- File: path/to/file"
+FILE_DELIMITER_PATTERN = re.compile(r"^--- File:\s*(.*?)\s*(?:---)?$")
+# Same as above, also accepting the "(NEW)" suffix Agent 3 uses for created files
+VALIDATION_FILE_DELIMITER_PATTERN = re.compile(r"^--- File:\s*(.*?)\s*(?:---)?(?:\s*\(NEW\))?$")
+# Code block markers (``` or ```robot etc.)
+CODE_BLOCK_PATTERN = re.compile(r"^```(\w*)$")
 
 # --- Helper Functions ---
 
-def should_ignore(path, ignore_patterns):
-    """Check if a path matches any of the ignore patterns."""
-    base_name = os.path.basename(path)
-    # Check base name first
-    if any(fnmatch.fnmatch(base_name, pattern) for pattern in ignore_patterns):
-        return True
-    # Check if any part of the path matches (for directories)
-    parts = path.split(os.sep)
-    if any(fnmatch.fnmatch(part, pattern) for part in parts for pattern in ignore_patterns):
-         # Be careful with directory patterns - ensure it's not just a file matching a dir pattern
-         if os.path.isdir(path) or base_name == part: # Check if it's the directory itself or a file matching a dir pattern exactly
-            return True
-    return False
-
-def traverse_directory(root_dir, ignore_patterns):
+def first_balanced_object(text):
     """
-    Traverses the directory, reads file contents, and formats the structure.
-    Excludes specified patterns.
+    Returns the first brace-balanced {...} substring of text, or None if there is none.
+    Single linear scan tracking nesting depth and JSON string/escape state, so braces
+    inside strings don't count and there is no regex backtracking on long responses.
     """
-    formatted_output = ""
-    print(f"Starting traversal from: {os.path.abspath(root_dir)}")
-    print(f"Ignoring patterns: {ignore_patterns}")
-
-    # Normalize root_dir path
-    root_dir = os.path.abspath(root_dir)
-
-    for root, dirs, files in os.walk(root_dir, topdown=True):
-        # Filter directories based on ignore patterns
-        dirs[:] = [d for d in dirs if not should_ignore(os.path.join(root, d), ignore_patterns)]
-
-        # Process files
-        for filename in files:
-            file_path = os.path.join(root, filename)
-            relative_path = os.path.relpath(file_path, root_dir)
-
-            if should_ignore(file_path, ignore_patterns):
-                # print(f"Ignoring file: {relative_path}")
-                continue
-
-            # print(f"Processing file: {relative_path}")
-            formatted_output += f"--- File: {relative_path} ---\n"
-            try:
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read()
-                    formatted_output += content + "\n\n"
-            except Exception as e:
-                formatted_output += f"[Error reading file {relative_path}: {e}]\n\n"
-
-    if not formatted_output:
-        print("Warning: No files found or read after applying ignore patterns.")
-    return formatted_output
+    depth = 0
+    start = 0
+    in_string = False
+    escaped_pos = -1
+    # Only visit braces, quotes and backslashes; everything else can't change the state
+    for match in JSON_STRUCTURE_PATTERN.finditer(text):
+        pos = match.start()
+        if pos == escaped_pos:
+            continue
+        char = match.group()
+        if in_string:
+            if char == '\\':
+                escaped_pos = pos + 1
+            elif char == '"':
+                in_string = False
+        elif char == '{':
+            if depth == 0:
+                start = pos
+            depth += 1
+        elif depth:
+            # Quotes outside an object are prose, not JSON strings
+            if char == '"':
+                in_string = True
+            elif char == '}':
+                depth -= 1
+                if depth == 0:
+                    return text[start:pos + 1]
+    return None
+
+def load_json(text):
+    """
+    Parses JSON text, using orjson when it is installed.
+    orjson is stricter than json: input it rejects (e.g. NaN or Infinity) is retried with json.loads,
+    so only text json also rejects raises json.JSONDecodeError. Accepted input can still differ:
+    orjson parses integers wider than 64 bits as floats instead of exact ints.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            # Retry with the standard parser, which decides what counts as invalid
+            pass
+    return json.loads(text)
 
 # --- Agent 1: Analysis and Planning ---
 
-def prepare_analysis_prompt(directory_structure, user_context=None):
-    """Prepares the prompt for Agent 1 (Analysis), incorporating user context."""
+def prepare_analysis_prompt(source_sections, user_context=None):
+    """
+    Prepares the prompt for Agent 1 (Analysis), incorporating user context.
+    source_sections is the list of decoded output pieces from traverse_directory; the prompt is
+    joined from them in a single pass instead of copying a pre-joined source dump into it.
+    """
     context_injection = ""
     if user_context:
         context_injection = f"""
@@ -122,10 +105,12 @@ IMPORTANT User Context/Overrides:
 Please take the above context into account during your analysis and planning. It may contain specific instructions, overrides, or focus areas.
 """
 
-    prompt = f"""
+    prompt_parts = ["""
 Analyze the following web application source code and structure:
 
-{directory_structure}
+"""]
+    prompt_parts.extend(source_sections)
+    prompt_parts.append(f"""
 {context_injection}
 Based on this analysis (and considering the user context if provided), generate a structured JSON plan for creating Robot Framework tests using the Page Object Model (POM).
 
@@ -164,84 +149,87 @@ Instructions for JSON Output:
 9.  **`setup_instructions_notes` (String):** Brief notes for setting up the test environment (e.g., "Requires Chrome WebDriver", "Needs environment variables X and Y").
 
 Generate ONLY the JSON object representing this plan. Be extremely precise about naming consistency between elements, keywords, and test steps to ensure proper traceability.
-"""
-    return prompt
+""")
+    return "".join(prompt_parts)
+
+def analysis_json_candidates(stripped_text):
+    """
+    Yields (description, candidate_text) pairs for parse_analysis_response to try.
+    The first character of the response picks the likely strategy, so a clean JSON
+    reply or a fenced reply is parsed once instead of going through every approach in turn.
+    Candidates are produced lazily, so later strategies cost nothing if an earlier one parses.
+    """
+    first_char = stripped_text[:1]
+
+    if first_char == '{':
+        # Clean JSON, as the prompt asks for
+        yield "directly (JSON)", stripped_text
+    elif first_char == '`':
+        # Look for a JSON block wrapped in triple backticks (```json ... ```)
+        match = JSON_BLOCK_PATTERN.search(stripped_text)
+        if match:
+            yield "from markdown code block", match.group(1).strip()
+        # Only remove outermost markdown code block markers if they wrap the entire content
+        if stripped_text.endswith("```"):
+            yield "after removing outer markdown markers", OUTER_FENCE_PATTERN.sub(r"\1", stripped_text)
+    else:
+        print("Warning: Analysis response does not start with JSON or a code block; searching the text for JSON.")
+        match = JSON_BLOCK_PATTERN.search(stripped_text)
+        if match:
+            yield "from markdown code block", match.group(1).strip()
+
+    # Last resort for every shape: the first complete JSON object in the text
+    json_object = first_balanced_object(stripped_text)
+    # Skip it when it is the whole text, which the direct attempt already tried
+    if json_object is not None and not (first_char == '{' and len(json_object) == len(stripped_text)):
+        yield "from extracted JSON object", json_object
 
 def parse_analysis_response(response_text):
     """Parses the JSON response from Agent 1, handling markdown formatting while preserving code examples."""
     print("--- Parsing Analysis Response ---")
+    analysis_plan = None
     try:
-        # First attempt: Try to parse the raw response directly
-        # This works if the response is already clean JSON
-        try:
-            analysis_plan = json.loads(response_text.strip())
-            print("Successfully parsed analysis plan directly (JSON).")
-            return analysis_plan
-        except json.JSONDecodeError:
-            # Direct parsing failed, try more sophisticated approaches
-            pass
-            
-        # Second attempt: Look for a JSON block wrapped in triple backticks
-        # This pattern finds content between ```json and ``` markers
-        json_block_pattern = re.compile(r"```json\s*([\s\S]*?)\s*```")
-        match = json_block_pattern.search(response_text)
-        
-        if match:
-            # Found a json code block, try parsing just that content
-            json_content = match.group(1).strip()
-            try:
-                analysis_plan = json.loads(json_content)
-                print("Successfully parsed analysis plan from markdown code block.")
-                return analysis_plan
-            except json.JSONDecodeError:
-                # JSON block wasn't valid, continue to next approach
-                pass
-                
-        # Third attempt: Try to find anything that looks like a complete JSON object
-        # Look for content starting with { and ending with }
-        json_pattern = re.compile(r"(\{[\s\S]*\})")
-        match = json_pattern.search(response_text)
-        
-        if match:
-            possible_json = match.group(1)
+        for description, candidate in analysis_json_candidates(response_text.strip()):
             try:
-                analysis_plan = json.loads(possible_json)
-                print("Successfully parsed analysis plan from extracted JSON object.")
-                return analysis_plan
+                analysis_plan = load_json(candidate)
             except json.JSONDecodeError:
-                # Not valid JSON, will proceed to final attempt
-                pass
-                
-        # Final attempt: Try a much more conservative approach
-        # Only remove outermost markdown code block markers if they appear to wrap the entire content
-        if response_text.strip().startswith("```") and response_text.strip().endswith("```"):
-            # Remove only the first ``` and last ```
-            cleaned_text = re.sub(r"^```(?:json)?\s*([\s\S]*)\s*```$", r"\1", response_text.strip())
-            try:
-                analysis_plan = json.loads(cleaned_text)
-                print("Successfully parsed analysis plan after removing outer markdown markers.")
-                return analysis_plan
-            except json.JSONDecodeError as e:
-                print(f"All JSON parsing attempts failed: {e}")
-                
-        print("Warning: Could not parse any valid JSON from the response.")
-        print("--- Raw Response Text (Agent 1) ---")
-        print(response_text[:500] + "..." if len(response_text) > 500 else response_text)
-        print("------------------------------------")
-        return None
-        
+                # Not valid JSON, try the next candidate
+                continue
+            print(f"Successfully parsed analysis plan {description}.")
+            break
+        else:
+            print("Warning: Could not parse any valid JSON from the response.")
+            print("--- Raw Response Text (Agent 1) ---")
+            print(response_text[:500] + "..." if len(response_text) > 500 else response_text)
+            print("------------------------------------")
+
     except Exception as e:
         print(f"Error parsing analysis response: {e}", file=sys.stderr)
         print("--- Raw Response Text (Agent 1) ---")
         print(response_text[:500] + "..." if len(response_text) > 500 else response_text)
         print("------------------------------------")
-        return None
+        analysis_plan = None
+
+    return analysis_plan
 
 # --- Agent 2: Code Generation ---
 
-def prepare_generation_prompt(analysis_plan_json, user_context=None):
-    """Prepares the prompt for Agent 2 (Code Generation), incorporating user context."""
-    plan_str = json.dumps(analysis_plan_json, indent=2)
+def serialize_plan(analysis_plan_json):
+    """
+    Serializes the analysis plan for embedding in prompts; non-ASCII text is kept as-is rather than escaped.
+    The orjson and json outputs are equivalent JSON but not byte-identical (e.g. floats: 1e100 vs 1e+100).
+    """
+    if orjson is not None:
+        return orjson.dumps(analysis_plan_json, option=orjson.OPT_INDENT_2).decode('utf-8')
+    return json.dumps(analysis_plan_json, indent=2, ensure_ascii=False)
+
+def prepare_generation_prompt(analysis_plan_json, user_context=None, plan_str=None):
+    """
+    Prepares the prompt for Agent 2 (Code Generation), incorporating user context.
+    Pass plan_str from serialize_plan() to reuse an already serialized plan.
+    """
+    if plan_str is None:
+        plan_str = serialize_plan(analysis_plan_json)
     context_injection = ""
     if user_context:
         context_injection = f"""
@@ -307,87 +295,65 @@ Generate the complete Robot Framework code now based strictly on the provided JS
 """
     return prompt
 
+def strip_response_lines(lines, start=0):
+    """
+    Strips the lines from start onward in place, as strip() on the text they were split from would:
+    trailing blank lines are dropped and the whitespace around the first and last non-blank lines removed.
+    Gives split lines the same start and end that strip() on the whole response used to, without copying it;
+    leading blank lines come before any file delimiter and are skipped anyway.
+    """
+    while len(lines) > start and (not lines[-1] or lines[-1].isspace()):
+        lines.pop()
+    if len(lines) > start:
+        lines[-1] = lines[-1].rstrip()
+    for index in range(start, len(lines)):
+        line = lines[index]
+        if line and not line.isspace():
+            lines[index] = line.lstrip()
+            return
+
+def buffered_file_content(buffer):
+    """Returns the text of a parsed file's line buffer, without the newline written after its last line."""
+    return buffer.getvalue()[:-1]
+
 def parse_generation_response(response):
     """Parses the AI response from Agent 2 to extract file contents, handling markdown formatting properly."""
     print("--- Parsing Generation Response ---")
     files = {}
     current_path = None
-    current_content = []
-    in_code_block = False
-    code_block_language = None
-
-    # Use regex for more robust parsing of the delimiter
-    # Matches lines like "--- File: path/to/file ---" or "--- File: path/to/file"
-    file_delimiter_pattern = re.compile(r"^--- File:\s*(.*?)\s*(?:---)?$")
-    # Pattern to detect code block markers
-    code_block_pattern = re.compile(r"^```(\w*)$")
-
-    def process_content(content_list, is_markdown_file=False):
-        """Process content based on file type and code block status."""
-        if not content_list:
-            return ""
-            
-        # Skip processing if this is a markdown file and we want to preserve its formatting
-        if is_markdown_file:
-            return "\n".join(content_list)
-            
-        # For non-markdown files, clean up any code block formatting
-        result = []
-        skip_next_line = False
-        in_internal_block = False
-        
-        for i, line in enumerate(content_list):
-            # Skip this line if flagged by previous iteration
-            if skip_next_line:
-                skip_next_line = False
-                continue
-                
-            # Check for code block markers
-            code_match = code_block_pattern.match(line.strip())
-            if code_match:
-                # Toggle code block state
-                in_internal_block = not in_internal_block
-                # Skip this line
-                continue
-                
-            # Add normal lines
-            result.append(line)
-            
-        return "\n".join(result)
-
-    for line in response.strip().split('\n'):
+    # Each file's lines are written straight into a buffer instead of a list joined later
+    current_buffer = io.StringIO()
+    # Markdown files keep their code fences; everywhere else fences only wrap the content
+    preserve_fences = False
+
+    # Split on '\n' only, like strip().split('\n') did, so other line-break characters such as \x0c or
+    # \u2028 stay in the content; stripping the split lines avoids strip()'s extra full-size copy
+    lines = response.split('\n')
+    strip_response_lines(lines)
+    for line in lines:
         # Check if this is a file delimiter line
-        file_match = file_delimiter_pattern.match(line)
+        file_match = FILE_DELIMITER_PATTERN.match(line)
         if file_match:
             # Save previous file content if there was one
             if current_path is not None:
-                # Check if this is likely a markdown file
-                is_markdown_file = current_path.lower().endswith(('.md', '.markdown'))
-                # Process content according to file type
-                processed_content = process_content(current_content, is_markdown_file)
                 normalized_path = current_path.replace('/', os.sep).replace('\\', os.sep)
-                files[normalized_path] = processed_content
+                files[normalized_path] = buffered_file_content(current_buffer)
 
             # Start new file
             current_path = file_match.group(1).strip()
-            current_content = []
-            in_code_block = False
+            current_buffer = io.StringIO()
+            preserve_fences = current_path.lower().endswith(('.md', '.markdown'))
         elif current_path is not None:
-            # Check for code block markers - only for tracking, actual removal happens in process_content
-            code_match = code_block_pattern.match(line.strip())
-            if code_match:
-                code_block_language = code_match.group(1)
-                in_code_block = not in_code_block
-                
-            # Always add the line - filtering happens during processing
-            current_content.append(line)
+            # Drop code block markers as we go so each line is visited only once
+            if not preserve_fences and CODE_BLOCK_PATTERN.match(line.strip()):
+                continue
+            current_buffer.write(line)
+            current_buffer.write("\n")
 
     # Don't forget the last file
     if current_path is not None:
-        is_markdown_file = current_path.lower().endswith(('.md', '.markdown'))
-        processed_content = process_content(current_content, is_markdown_file)
         normalized_path = current_path.replace('/', os.sep).replace('\\', os.sep)
-        files[normalized_path] = processed_content
+        files[normalized_path] = buffered_file_content(current_buffer)
 
     if not files:
         print("Warning: No files extracted from response.")
@@ -397,9 +363,13 @@ def parse_generation_response(response):
 
 # --- Agent 3: Validation and Enhancement ---
 
-def prepare_validation_prompt(analysis_plan_json, generated_files, user_context=None):
-    """Prepares the prompt for Agent 3 (Validation), incorporating user context."""
-    plan_str = json.dumps(analysis_plan_json, indent=2)
+def prepare_validation_prompt(analysis_plan_json, generated_files, user_context=None, plan_str=None):
+    """
+    Prepares the prompt for Agent 3 (Validation), incorporating user context.
+    Pass plan_str from serialize_plan() to reuse an already serialized plan.
+    """
+    if plan_str is None:
+        plan_str = serialize_plan(analysis_plan_json)
     
     # Format the generated files for inclusion in the prompt
     files_str = ""
@@ -497,22 +467,20 @@ def parse_validation_response(response):
     validation_report = None
     
     # More robust JSON pattern to handle triple backticks with or without language indicator
-    json_pattern = re.compile(r"```(?:json)?\s*([\s\S]*?)\s*```")
-    json_match = json_pattern.search(response)
+    json_match = FENCED_BLOCK_PATTERN.search(response)
     
     if json_match:
         try:
             json_text = json_match.group(1).strip()
-            validation_report = json.loads(json_text)
+            validation_report = load_json(json_text)
             print("Successfully parsed validation report (JSON).")
         except json.JSONDecodeError as e:
             print(f"Error: Failed to decode JSON validation report: {e}", file=sys.stderr)
             # Fallback: try to find raw JSON object
             try:
-                json_obj_pattern = re.compile(r"(\{[\s\S]*\})")
-                json_obj_match = json_obj_pattern.search(response)
-                if json_obj_match:
-                    validation_report = json.loads(json_obj_match.group(1))
+                json_object = first_balanced_object(response)
+                if json_object is not None:
+                    validation_report = load_json(json_object)
                     print("Successfully parsed validation report using fallback method.")
             except:
                 print("All validation report parsing methods failed.")
@@ -522,105 +490,72 @@ def parse_validation_response(response):
     # Extract fixed files using improved parsing logic
     files = {}
     current_path = None
-    current_content = []
-    in_code_block = False
+    # Each file's lines are written straight into a buffer instead of a list joined later
+    current_buffer = io.StringIO()
+    # Markdown files keep their code fences; everywhere else fences only wrap the content
+    preserve_fences = False
     
     # Find where the file section starts (after the JSON validation report)
-    file_section = response
-    if json_match:
-        # Get everything after the first JSON block
-        json_end_pos = json_match.end()
-        if json_end_pos < len(response):
-            file_section = response[json_end_pos:]
-    
-    file_delimiter_pattern = re.compile(r"^--- File:\s*(.*?)\s*(?:---)?(?:\s*\(NEW\))?$")
-    code_block_pattern = re.compile(r"^```(\w*)$")
-    
-    def process_content(content_list, is_markdown_file=False):
-        """Process content based on file type."""
-        if not content_list:
-            return ""
-            
-        # Preserve formatting for markdown files
-        if is_markdown_file:
-            return "\n".join(content_list)
-            
-        # For non-markdown files, clean up code block formatting
-        result = []
-        skip_next_line = False
-        in_internal_block = False
-        
-        for i, line in enumerate(content_list):
-            # Skip this line if flagged by previous iteration
-            if skip_next_line:
-                skip_next_line = False
-                continue
-                
-            # Check for code block markers
-            code_match = code_block_pattern.match(line.strip())
-            if code_match:
-                # Toggle code block state
-                in_internal_block = not in_internal_block
-                # Skip this line
-                continue
-                
-            # Add normal lines
-            result.append(line)
-            
-        return "\n".join(result)
+    # Skip the report's lines instead of slicing off a copy of the remaining response
+    lines = response.split('\n')
+    first_file_line = 0
+    if json_match and json_match.end() < len(response):
+        report_lines = response[:json_match.end()].split('\n')
+        first_file_line = len(report_lines) - 1
+        # The section starts right after the closing fence, which may share its line with a delimiter
+        lines[first_file_line] = lines[first_file_line][len(report_lines[-1]):]
+    strip_response_lines(lines, first_file_line)
     
-    for line in file_section.strip().split('\n'):
+    for line in itertools.islice(lines, first_file_line, None):
         # Check if this is a file delimiter
-        file_match = file_delimiter_pattern.match(line)
+        file_match = VALIDATION_FILE_DELIMITER_PATTERN.match(line)
         if file_match:
             # Save previous file if there was one
             if current_path is not None:
-                is_markdown_file = current_path.lower().endswith(('.md', '.markdown'))
-                processed_content = process_content(current_content, is_markdown_file)
                 normalized_path = current_path.replace('/', os.sep).replace('\\', os.sep)
-                files[normalized_path] = processed_content
+                files[normalized_path] = buffered_file_content(current_buffer)
             
             # Start new file
             current_path = file_match.group(1).strip()
-            current_content = []
-            in_code_block = False
+            current_buffer = io.StringIO()
+            preserve_fences = current_path.lower().endswith(('.md', '.markdown'))
         elif current_path is not None:
-            # Track code blocks for better processing
-            code_match = code_block_pattern.match(line.strip())
-            if code_match:
-                in_code_block = not in_code_block
-                
-            # Always add line - filtering happens during processing
-            current_content.append(line)
+            # Drop code block markers as we go so each line is visited only once
+            if not preserve_fences and CODE_BLOCK_PATTERN.match(line.strip()):
+                continue
+            current_buffer.write(line)
+            current_buffer.write("\n")
     
     # Don't forget the last file
     if current_path is not None:
-        is_markdown_file = current_path.lower().endswith(('.md', '.markdown'))
-        processed_content = process_content(current_content, is_markdown_file)
         normalized_path = current_path.replace('/', os.sep).replace('\\', os.sep)
-        files[normalized_path] = processed_content
+        files[normalized_path] = buffered_file_content(current_buffer)
     
     return validation_report, files
 
 # --- LLM Interaction ---
 
+@lru_cache(maxsize=4)
+def get_gemini_model(api_key, model_name):
+    """Configures Gemini and builds the model once per (api_key, model_name), so all agents share one client."""
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(model_name)
+
 def interact_with_gemini(prompt, api_key, agent_name="Agent"):
     """Sends the prompt to Gemini AI and gets the response."""
     print(f"--- Configuring Gemini AI for {agent_name} ---")
     try:
-        # Consider configuring once if API key doesn't change
-        genai.configure(api_key=api_key)
         # Select appropriate model based on task complexity
         if agent_name == "Agent 2 (Generation)":
             # Use more capable model for validation which requires deeper analysis
-            model = genai.GenerativeModel('gemini-2.0-flash-001')
-            # model = genai.GenerativeModel('gemini-2.5-pro-exp-03-25') # Or choose another suitable model
+            model_name = 'gemini-2.0-flash-001'
+            # model_name = 'gemini-2.5-pro-exp-03-25' # Or choose another suitable model
         else:
             # Use faster model for other tasks
-            model = genai.GenerativeModel('gemini-2.0-flash-001')
-            # model = genai.GenerativeModel('gemini-2.5-pro-exp-03-25') # Or choose another suitable model
+            model_name = 'gemini-2.0-flash-001'
+            # model_name = 'gemini-2.5-pro-exp-03-25' # Or choose another suitable model
+        model = get_gemini_model(api_key, model_name)
 
-        
         print(f"--- Sending Prompt to {agent_name} ---")
         response = model.generate_content(prompt)
         print(f"--- Received Response from {agent_name} ---")
@@ -645,78 +580,41 @@ def interact_with_gemini(prompt, api_key, agent_name="Agent"):
         print(f"Error interacting with Gemini API for {agent_name}: {e}", file=sys.stderr)
         return None
 
-# --- File Storage ---
-
-def store_test_files(files, output_dir="robot_tests", clear_output=False):
-    """Stores the generated files in the specified directory."""
-    print(f"--- Storing Files in {output_dir} ---")
-
-    abs_output_dir = os.path.abspath(output_dir)
-
-    if clear_output and os.path.exists(abs_output_dir):
-        try:
-            shutil.rmtree(abs_output_dir)
-            print(f"Cleared existing output directory: {abs_output_dir}")
-        except OSError as e:
-            print(f"Error clearing directory {abs_output_dir}: {e}", file=sys.stderr)
-
-    # Ensure the base output directory exists after potential clearing
-    if not os.path.exists(abs_output_dir):
-        try:
-            os.makedirs(abs_output_dir)
-            print(f"Created output directory: {abs_output_dir}")
-        except OSError as e:
-            print(f"Error creating directory {abs_output_dir}: {e}", file=sys.stderr)
-            sys.exit(1) # Exit if we can't create the main output dir
-
-    files_written = 0
-    for relative_file_path, content in files.items():
-        if not relative_file_path or relative_file_path.isspace():
-            print(f"Warning: Skipping file with invalid relative path provided by AI: '{relative_file_path}'", file=sys.stderr)
-            continue
-
-        normalized_relative_path = os.path.normpath(relative_file_path)
-
-        if ".." in normalized_relative_path.split(os.sep):
-             print(f"Warning: Skipping potentially unsafe file path provided by AI: '{relative_file_path}'", file=sys.stderr)
-             continue
+# --- Intermediate Saves ---
 
-        if os.path.isabs(normalized_relative_path):
-             print(f"Warning: Skipping absolute file path provided by AI: '{relative_file_path}'", file=sys.stderr)
-             continue
+def save_intermediate_plan(plan_file_path, plan_str):
+    """Writes the serialized analysis plan, creating the output directory if needed."""
+    os.makedirs(os.path.dirname(plan_file_path), exist_ok=True)
+    write_text_file(plan_file_path, plan_str)
 
-        full_path = os.path.join(abs_output_dir, normalized_relative_path)
-        full_path = os.path.abspath(full_path)
-
-        # Security Check: Ensure the final path is truly within the output directory
-        # Allow writing to the output directory itself (e.g., README.md)
-        if not full_path.startswith(abs_output_dir + os.sep) and full_path != abs_output_dir:
-            print(f"Warning: Skipping file path attempting to write outside output directory: '{relative_file_path}' resolved to '{full_path}' (outside '{abs_output_dir}')", file=sys.stderr)
-            continue
-
-        file_dir = os.path.dirname(full_path)
-        if file_dir and file_dir != abs_output_dir and not os.path.exists(file_dir):
-            try:
-                os.makedirs(file_dir)
-                print(f"Created subdirectory: {file_dir}")
-            except OSError as e:
-                 print(f"Error creating subdirectory {file_dir} for {full_path}: {e}", file=sys.stderr)
-                 continue
+def save_intermediate_generation(intermediate_dir, generated_files):
+    """Replaces intermediate_dir with the files generated by Agent 2, reusing the parallel file writer."""
+    if os.path.exists(intermediate_dir):
+        shutil.rmtree(intermediate_dir)
+    os.makedirs(intermediate_dir, exist_ok=True)
+    store_test_files(generated_files, intermediate_dir, quiet=True)
 
+def report_intermediate_saves(intermediate_saves):
+    """
+    Waits for the background saves queued as (future, success message, description) and reports
+    each result in submission order, then empties the list so the saves are only reported once.
+    """
+    for future, saved_message, description in intermediate_saves:
         try:
-            with open(full_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-            print(f"Wrote file: {full_path}")
-            files_written += 1
+            future.result()
+            print(saved_message)
         except Exception as e:
-            print(f"Error writing file {full_path}: {e}", file=sys.stderr)
-
-    print(f"--- Finished Storing Files ({files_written} written) ---")
+            print(f"Warning: Could not save {description}: {e}")
+    intermediate_saves.clear()
 
 # --- Main Execution ---
 
 def main():
-    parser = argparse.ArgumentParser(description="Generate Robot Framework tests using a three-agent AI approach: Analysis, Generation, and Validation.")
+    parser = argparse.ArgumentParser(
+        description="Generate Robot Framework tests using a three-agent AI approach: Analysis, Generation, and Validation.",
+        epilog=f"Only source files with these extensions are analyzed: {', '.join(sorted(SOURCE_EXTENSIONS))} "
+               f"(plus {', '.join(sorted(SOURCE_FILENAMES))}). Other files, and files larger than "
+               f"{MAX_FILE_BYTES // 1024} KiB, are listed but their content is skipped.")
     parser.add_argument("app_path", help="Path to the web application directory.")
     parser.add_argument("-c", "--context", help="Optional text context/instructions to provide to all AI agents.", default=None)
     parser.add_argument("-o", "--output", help="Output directory for generated tests.", default="robot_tests")
@@ -747,14 +645,20 @@ def main():
     print(f"Traversing directory: {args.app_path}")
     # Update ignore patterns to include the specific output directory being used
     current_ignore_patterns = IGNORE_PATTERNS + [os.path.basename(args.output)]
-    directory_structure = traverse_directory(args.app_path, current_ignore_patterns)
+    # Collect the sections as a list, decoding each UTF-8 piece as it arrives;
+    # they are joined only once, into the prompt itself
+    source_sections = []
+    collect_section = lambda piece: source_sections.append(piece.decode('utf-8', errors='ignore'))
+    files_found = traverse_directory(args.app_path, current_ignore_patterns, collect_section)
 
-    if not directory_structure:
+    if not files_found:
         print("Agent 1 Error: No files found to analyze after applying ignore patterns. Exiting.", file=sys.stderr)
         sys.exit(1)
 
     print("Preparing analysis prompt for Agent 1...")
-    analysis_prompt = prepare_analysis_prompt(directory_structure, args.context)
+    analysis_prompt = prepare_analysis_prompt(source_sections, args.context)
+    # The prompt now holds the source; don't keep a second copy alive through the agent calls
+    source_sections.clear()
 
     print("Interacting with Agent 1 (Analysis)...")
     analysis_response_text = interact_with_gemini(analysis_prompt, api_key, agent_name="Agent 1 (Analysis)")
@@ -769,115 +673,107 @@ def main():
         print("Agent 1 Error: Failed to parse the analysis plan from AI response. Exiting.", file=sys.stderr)
         sys.exit(1)
 
-    # Save intermediate plan if requested
-    if args.save_intermediate:
-        try:
-            os.makedirs(args.output, exist_ok=True)
+    # Intermediate saves run on background threads while the next agent works;
+    # their results are reported from the main thread by report_intermediate_saves
+    intermediate_saves = []
+    saver = ThreadPoolExecutor(max_workers=2) if args.save_intermediate else None
+    try:
+        # Serialize the plan once; it is shared by the generation and validation prompts
+        plan_str = serialize_plan(analysis_plan)
+
+        # Save intermediate plan if requested
+        if args.save_intermediate:
             plan_file_path = os.path.join(args.output, "intermediate_plan.json")
-            with open(plan_file_path, 'w') as f:
-                json.dump(analysis_plan, f, indent=2)
-            print(f"Saved intermediate analysis plan to: {plan_file_path}")
-        except Exception as e:
-            print(f"Warning: Could not save intermediate plan: {e}")
+            intermediate_saves.append((saver.submit(save_intermediate_plan, plan_file_path, plan_str),
+                                       f"Saved intermediate analysis plan to: {plan_file_path}", "intermediate plan"))
 
-    # === Agent 2: Generation ===
-    print(f"\n=== Running Agent 2: Generation ===")
-    print("Preparing generation prompt for Agent 2...")
-    generation_prompt = prepare_generation_prompt(analysis_plan, args.context)
+        # === Agent 2: Generation ===
+        print(f"\n=== Running Agent 2: Generation ===")
+        print("Preparing generation prompt for Agent 2...")
+        generation_prompt = prepare_generation_prompt(analysis_plan, args.context, plan_str=plan_str)
 
-    print("Interacting with Agent 2 (Generation)...")
-    generation_response_text = interact_with_gemini(generation_prompt, api_key, agent_name="Agent 2 (Generation)")
+        print("Interacting with Agent 2 (Generation)...")
+        generation_response_text = interact_with_gemini(generation_prompt, api_key, agent_name="Agent 2 (Generation)")
 
-    if generation_response_text is None:
-        print("Agent 2 Error: Failed to get response from AI. Exiting.", file=sys.stderr)
-        sys.exit(1)
+        if generation_response_text is None:
+            print("Agent 2 Error: Failed to get response from AI. Exiting.", file=sys.stderr)
+            sys.exit(1)
 
-    print("Parsing generation response from Agent 2...")
-    generated_files = parse_generation_response(generation_response_text)
+        print("Parsing generation response from Agent 2...")
+        generated_files = parse_generation_response(generation_response_text)
 
-    if not generated_files:
-        print("Agent 2 Error: AI did not return any files to store based on the plan. Exiting.", file=sys.stderr)
-        sys.exit(1)
+        if not generated_files:
+            print("Agent 2 Error: AI did not return any files to store based on the plan. Exiting.", file=sys.stderr)
+            sys.exit(1)
     
-    # Save intermediate files if requested
-    if args.save_intermediate:
-        intermediate_dir = os.path.join(args.output, "intermediate_generation")
-        try:
-            if os.path.exists(intermediate_dir):
-                shutil.rmtree(intermediate_dir)
-            os.makedirs(intermediate_dir, exist_ok=True)
-            for rel_path, content in generated_files.items():
-                file_path = os.path.join(intermediate_dir, rel_path)
-                os.makedirs(os.path.dirname(file_path), exist_ok=True)
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(content)
-            print(f"Saved intermediate generated files to: {intermediate_dir}")
-        except Exception as e:
-            print(f"Warning: Could not save intermediate files: {e}")
-
-    # === Agent 3: Validation ===
-    final_files = generated_files.copy()  # Default to generated files if no validation step
-
-    if not args.skip_validation:
-        print(f"\n=== Running Agent 3: Validation ===")
-        print("Preparing validation prompt for Agent 3...")
-        validation_prompt = prepare_validation_prompt(analysis_plan, generated_files, args.context)
-
-        # --- Save validation prompt for debugging ---
-
-        prompt_file_path = os.path.join('./', "validation_prompt.txt")
-        os.makedirs(os.path.dirname(prompt_file_path), exist_ok=True) # Ensure output dir exists
-        with open(prompt_file_path, 'w', encoding='utf-8') as f:
-            f.write(validation_prompt)
-        print(f"Saved validation prompt to: {prompt_file_path}")
-           
-        # --- End save validation prompt ---
-
-        print("Interacting with Agent 3 (Validation)...")
-        validation_response_text = interact_with_gemini(validation_prompt, api_key, agent_name="Agent 3 (Validation)")
-
-        if validation_response_text is None:
-            print("Agent 3 Warning: Failed to get response from validation agent. Proceeding with unvalidated files.", file=sys.stderr)
-        else:
-            print("Parsing validation response from Agent 3...")
-            validation_report, validated_files = parse_validation_response(validation_response_text)
+        # Save intermediate files if requested
+        if args.save_intermediate:
+            intermediate_dir = os.path.join(args.output, "intermediate_generation")
+            intermediate_saves.append((saver.submit(save_intermediate_generation, intermediate_dir, generated_files),
+                                       f"Saved intermediate generated files to: {intermediate_dir}", "intermediate files"))
+
+        # === Agent 3: Validation ===
+        final_files = generated_files.copy()  # Default to generated files if no validation step
+
+        if not args.skip_validation:
+            print(f"\n=== Running Agent 3: Validation ===")
+            print("Preparing validation prompt for Agent 3...")
+            validation_prompt = prepare_validation_prompt(analysis_plan, generated_files, args.context, plan_str=plan_str)
+
+            # Save validation prompt for debugging
+            if args.save_intermediate:
+                prompt_file_path = os.path.join('./', "validation_prompt.txt")
+                intermediate_saves.append((saver.submit(write_text_file, prompt_file_path, validation_prompt),
+                                           f"Saved validation prompt to: {prompt_file_path}", "validation prompt"))
+
+            print("Interacting with Agent 3 (Validation)...")
+            validation_response_text = interact_with_gemini(validation_prompt, api_key, agent_name="Agent 3 (Validation)")
+
+            if validation_response_text is None:
+                print("Agent 3 Warning: Failed to get response from validation agent. Proceeding with unvalidated files.", file=sys.stderr)
+            else:
+                print("Parsing validation response from Agent 3...")
+                validation_report, validated_files = parse_validation_response(validation_response_text)
             
-            # Save validation report if intermediate saving is enabled
-            if args.save_intermediate and validation_report:
-                try:
+                # Save validation report if intermediate saving is enabled
+                if args.save_intermediate and validation_report:
                     validation_report_path = os.path.join(args.output, "validation_report.json")
-                    with open(validation_report_path, 'w') as f:
-                        json.dump(validation_report, f, indent=2)
-                    print(f"Saved validation report to: {validation_report_path}")
-                except Exception as e:
-                    print(f"Warning: Could not save validation report: {e}")
+                    intermediate_saves.append((saver.submit(write_text_file, validation_report_path, json.dumps(validation_report, indent=2)),
+                                               f"Saved validation report to: {validation_report_path}", "validation report"))
             
-            # Log validation findings
-            if validation_report:
-                issues_found = validation_report.get('issues_found', False)
-                issues = validation_report.get('issues', [])
+                # Log validation findings
+                if validation_report:
+                    issues_found = validation_report.get('issues_found', False)
+                    issues = validation_report.get('issues', [])
                 
-                if issues_found:
-                    print(f"Validation found {len(issues)} issues:")
-                    for i, issue in enumerate(issues, 1):
-                        print(f"  {i}. [{issue.get('file', 'Unknown')}] {issue.get('issue_type', 'Unknown issue')}: {issue.get('description', 'No description')}")
+                    if issues_found:
+                        print(f"Validation found {len(issues)} issues:")
+                        for i, issue in enumerate(issues, 1):
+                            print(f"  {i}. [{issue.get('file', 'Unknown')}] {issue.get('issue_type', 'Unknown issue')}: {issue.get('description', 'No description')}")
                     
-                    # Update files with validated versions
-                    if validated_files:
-                        print(f"Applying fixes to {len(validated_files)} files...")
-                        final_files.update(validated_files)
+                        # Update files with validated versions
+                        if validated_files:
+                            print(f"Applying fixes to {len(validated_files)} files...")
+                            final_files.update(validated_files)
+                        else:
+                            print("Warning: Issues were found but no fixed files were provided.")
                     else:
-                        print("Warning: Issues were found but no fixed files were provided.")
+                        print("Validation complete: No issues found in generated code.")
                 else:
-                    print("Validation complete: No issues found in generated code.")
-            else:
-                print("Warning: Could not parse validation report, proceeding with unvalidated files.")
-
-    # === Store Files ===
-    print(f"\n=== Storing Final Files ===")
-    store_test_files(final_files, args.output, args.clear_output)
-
-    print("\nTest generation process complete.")
+                    print("Warning: Could not parse validation report, proceeding with unvalidated files.")
+
+        # === Store Files ===
+        # Intermediate saves write under the output directory, so let them finish before it may be cleared
+        report_intermediate_saves(intermediate_saves)
+        print(f"\n=== Storing Final Files ===")
+        store_test_files(final_files, args.output, args.clear_output)
+
+        print("\nTest generation process complete.")
+    finally:
+        # Also reached on the sys.exit() paths, so failed saves are still reported
+        report_intermediate_saves(intermediate_saves)
+        if saver is not None:
+            saver.shutdown()
 
 if __name__ == "__main__":
     main()